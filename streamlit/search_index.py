@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from text_processing import search_query_terms, search_tokenize
+
+EXACT_MATCH_BOOST = 2.0
+
+def build_search_index(comments_df):
+    tokens = comments_df['Comment'].reset_index(drop=True).map(search_tokenize)
+    terms = tokens.explode().dropna()
+    postings = (
+        pd.DataFrame({'term': terms.to_numpy(dtype=str), 'row': terms.index.to_numpy(dtype=np.int64)})
+        .groupby(['term', 'row'])
+        .size()
+        .rename('tf')
+        .reset_index()
+    )
+
+    # Postings are sorted by term, so every term (and every run of terms that
+    # share a prefix) maps to one contiguous range of the posting arrays.
+    vocabulary, term_starts = np.unique(postings['term'].to_numpy(dtype=str), return_index=True)
+    term_offsets = np.append(term_starts, len(postings))
+    document_frequency = np.diff(term_offsets)
+    idf = np.log1p(len(tokens) / np.maximum(document_frequency, 1))
+
+    return {
+        'vocabulary': vocabulary,
+        'term_offsets': term_offsets,
+        'rows': postings['row'].to_numpy(dtype=np.int64),
+        'weights': postings['tf'].to_numpy(dtype=np.float64) * np.repeat(idf, document_frequency),
+    }
+
+def match_term(search_index, term):
+    vocabulary = search_index['vocabulary']
+    term_offsets = search_index['term_offsets']
+    first = np.searchsorted(vocabulary, term, side='left')
+    last = np.searchsorted(vocabulary, term + '\uffff', side='left')
+    start, stop = term_offsets[first], term_offsets[last]
+
+    weights = search_index['weights'][start:stop].copy()
+    if first < len(vocabulary) and vocabulary[first] == term:
+        weights[:term_offsets[first + 1] - start] *= EXACT_MATCH_BOOST
+
+    rows, inverse = np.unique(search_index['rows'][start:stop], return_inverse=True)
+    return rows, np.bincount(inverse, weights=weights, minlength=len(rows))
+
+def search(search_index, query, candidate_rows=None):
+    query_terms = search_query_terms(query)
+    if not query_terms:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+    # Every query term has to match, either exactly or as a prefix.
+    rows, scores = match_term(search_index, query_terms[0])
+    for term in query_terms[1:]:
+        term_rows, term_scores = match_term(search_index, term)
+        rows, left, right = np.intersect1d(rows, term_rows, assume_unique=True, return_indices=True)
+        scores = scores[left] + term_scores[right]
+
+    if candidate_rows is not None:
+        keep = np.isin(rows, candidate_rows, assume_unique=True)
+        rows, scores = rows[keep], scores[keep]
+
+    order = np.lexsort((rows, -scores))
+    return rows[order], scores[order]
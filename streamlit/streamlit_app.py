@@ -1,19 +1,40 @@
+import time
+SCRIPT_START = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
-from collections import Counter
-import re
-import nltk
+import numpy as np
+import os
 import json
+from text_processing import TERM_STOPWORD_PATHS, flag_replies, search_query_terms
 
-nltk.download('stopwords', quiet=True)
-from nltk.corpus import stopwords
+# Heavier modules (plotly, term and search indexes) are imported inside the panels
+# that use them so the first paint is not blocked on them.
+IMPORTS_DONE = time.perf_counter()
 
 st.set_page_config(page_title='Survey Dashboard', layout='wide', page_icon="📊")
 
+SENTIMENT_LABELS = ['positive', 'neutral', 'negative']
+SORT_OPTIONS = {
+    # File order, or relevance while a search query is active.
+    'Default / relevance': None,
+    'Positive probability': 'Positive',
+    'Neutral probability': 'Neutral',
+    'Negative probability': 'Negative',
+    'Likes': 'Likes',
+}
+PAGE_SIZE_OPTIONS = [25, 50, 100, 250]
+COMMENT_JSON_COLUMNS = ['post_link', 'username', 'comment', 'is_reply', 'reply_to', 'likes', 'timestamp']
+
+def get_data_version(file_path):
+    try:
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
 @st.cache_data
-def load_data(file_path, separator=',', encoding='utf-8'):
+def load_data(file_path, separator=',', encoding='utf-8', data_version=None):
     try:
         df = pd.read_csv(file_path, sep=separator, encoding=encoding)
         return df
@@ -21,25 +42,108 @@ def load_data(file_path, separator=',', encoding='utf-8'):
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
     
-def load_comments_json(file_path):
+@st.cache_data
+def load_comments_json(file_path, data_version=None):
     try:
-        with open(file_path, 'r') as file:
+        with open(file_path, 'r', encoding='utf-8') as file:
             data = json.load(file)
-        comments_data = []
-        for post in data:
-            for comment in post['comments']:
-                comments_data.append({
-                    'post_link': post['post_link'],
-                    'username': comment['username'],
-                    'comment': comment['comment'],
-                    'is_reply': comment['is_reply'],
-                    'reply_to': comment['reply_to'],
-                    'timestamp': comment['timestamp']
-                })
-        return pd.DataFrame(comments_data)
+        comments_df = pd.json_normalize(data, record_path='comments', meta=['post_link'])
+        comments_df = comments_df.reindex(columns=COMMENT_JSON_COLUMNS)
+        comments_df['likes'] = pd.to_numeric(comments_df['likes'], errors='coerce').astype('Int64')
+        comments_df['timestamp'] = pd.to_datetime(comments_df['timestamp'], errors='coerce', utc=True)
+        return comments_df
     except Exception as e:
         st.error(f"Error loading comments data: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=COMMENT_JSON_COLUMNS)
+
+def bind_comment_details(sentiment_df, comments_df):
+    details = pd.DataFrame({
+        'post_username': comments_df['post_link'].str.split('/').str[3],
+        'Comment': comments_df['comment'],
+        'Likes': comments_df['likes'],
+        'Timestamp': comments_df['timestamp'],
+    })
+
+    # The same text can be posted more than once under a post, so pair the
+    # rows by occurrence as well as by (post, comment).
+    keys = ['post_username', 'Comment']
+    details['occurrence'] = details.groupby(keys, dropna=False).cumcount()
+    sentiment_df = sentiment_df.assign(occurrence=sentiment_df.groupby(keys, dropna=False).cumcount())
+    return sentiment_df.merge(details, on=keys + ['occurrence'], how='left').drop(columns='occurrence')
+
+@st.cache_resource(max_entries=2)
+def build_comment_store(file_path, data_version, comments_json_path=None, comments_json_version=None):
+    comments = load_data(file_path, data_version=data_version)
+    comments = comments.reindex(columns=comments.columns.union(['Comment', 'Sentiment', 'post_username'], sort=False))
+    if comments_json_path is not None:
+        comments = bind_comment_details(comments, load_comments_json(comments_json_path, data_version=comments_json_version))
+
+    comments = comments.reset_index(drop=True)
+    comments['post_username'] = comments['post_username'].astype('category')
+    comments['Sentiment'] = pd.Categorical(comments['Sentiment'], categories=SENTIMENT_LABELS)
+    comments['is_reply'] = flag_replies(comments['Comment'])
+
+    # Row positions of each post's comments, in file order, so a username
+    # filter is a dict lookup instead of a scan over every comment.
+    username_rows = {
+        username: rows.astype(np.int64)
+        for username, rows in comments.groupby('post_username', observed=True).indices.items()
+    }
+
+    return {
+        'data_version': (data_version, comments_json_version),
+        'comments': comments,
+        'username_rows': username_rows,
+        'is_reply': comments['is_reply'].to_numpy(),
+        'sentiment_codes': comments['Sentiment'].cat.codes.to_numpy(),
+    }
+
+def query_comment_store(store, username, comment_type, sentiments):
+    if username == "All Posts":
+        rows = np.arange(len(store['comments']))
+    else:
+        rows = store['username_rows'].get(username, np.array([], dtype=np.int64))
+
+    mask = np.ones(len(rows), dtype=bool)
+    if comment_type == 'non-reply':
+        mask &= ~store['is_reply'][rows]
+    if sentiments:
+        wanted = [SENTIMENT_LABELS.index(sentiment) for sentiment in sentiments]
+        mask &= np.isin(store['sentiment_codes'][rows], wanted)
+
+    return rows[mask]
+
+# The store itself is not hashed; its data version keys the cached results.
+@st.cache_data(max_entries=32)
+def filter_comment_positions(_store, data_version, username, comment_type, sentiments):
+    return query_comment_store(_store, username, comment_type, list(sentiments))
+
+@st.cache_resource(max_entries=2)
+def load_search_index(_comment_store, data_version):
+    from search_index import build_search_index
+
+    return build_search_index(_comment_store['comments'])
+
+@st.cache_data(max_entries=32)
+def search_comment_positions(_store, data_version, username, comment_type, sentiments, query):
+    from search_index import search
+
+    candidates = filter_comment_positions(_store, data_version, username, comment_type, sentiments)
+    positions, _ = search(load_search_index(_store, data_version), query, candidate_rows=candidates)
+    return positions
+
+@st.cache_data(max_entries=32)
+def sort_comment_positions(_store, data_version, username, comment_type, sentiments, sort_column, ascending, query=''):
+    if query:
+        positions = search_comment_positions(_store, data_version, username, comment_type, sentiments, query)
+    else:
+        positions = filter_comment_positions(_store, data_version, username, comment_type, sentiments)
+    if sort_column is None:
+        return positions
+
+    values = pd.Series(_store['comments'][sort_column].to_numpy()[positions])
+    order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    return positions[order]
     
 def display_instagram_content(post_link, likes_count, comments_count):
     if '/reel/' in post_link:
@@ -118,14 +222,118 @@ def display_instagram_content(post_link, likes_count, comments_count):
                 unsafe_allow_html=True
             )
             
+@st.cache_resource(max_entries=2)
+def load_term_index(_comment_store, data_version, sentiment_df_path, index_path, fingerprint_path, files_version):
+    from term_index import build_term_counts, build_term_index, is_term_index_current
+    from text_processing import load_stopwords, load_term_stopwords
+
+    # File versions only decide when to look again; whether the offline index
+    # is usable is decided by the content fingerprint written next to it.
+    load_stopwords.cache_clear()
+    load_term_stopwords.cache_clear()
+    built_in_app = not is_term_index_current(index_path, fingerprint_path, sentiment_df_path)
+    if built_in_app:
+        term_counts = build_term_counts(_comment_store['comments'])
+    else:
+        term_counts = pd.read_csv(index_path, keep_default_na=False)
+
+    term_index = build_term_index(term_counts)
+    term_index['version'] = (data_version, files_version)
+    term_index['built_in_app'] = built_in_app
+    return term_index
+
+@st.cache_data(max_entries=64)
+def top_terms_for_filter(_term_index, index_version, username, comment_type, sentiment, k):
+    from term_index import top_terms
+
+    return top_terms(
+        _term_index,
+        username=None if username == "All Posts" else username,
+        sentiments=[sentiment],
+        include_replies=comment_type != 'non-reply',
+        k=k
+    )
+
+def display_top_words(term_index, selected_username, selected_comment_type, selected_sentiments):
+    import plotly.express as px
+
+    st.title("Top Words")
+    if term_index['built_in_app']:
+        st.caption(
+            "The offline term index was built from different comments, stopword lists or "
+            "term index version, so it was rebuilt for this session. "
+            "Run `python streamlit/term_index.py` to refresh it."
+        )
+    top_k = st.slider("Number of words", min_value=5, max_value=30, value=10)
+
+    term_sentiments = selected_sentiments or SENTIMENT_LABELS
+    term_columns = st.columns(len(term_sentiments))
+    for term_col, sentiment in zip(term_columns, term_sentiments):
+        terms_df = top_terms_for_filter(
+            term_index,
+            term_index['version'],
+            selected_username,
+            selected_comment_type,
+            sentiment,
+            top_k
+        )
+        with term_col:
+            if terms_df.empty:
+                st.caption(f"No {sentiment} words for the current filters.")
+                continue
+            fig = px.bar(
+                terms_df.iloc[::-1],
+                x='count',
+                y='term',
+                orientation='h',
+                title=f"{sentiment.title()} comments",
+                color_discrete_sequence=px.colors.qualitative.Set3
+            )
+            fig.update_layout(height=max(300, 28 * len(terms_df)), yaxis_title=None, xaxis_title=None)
+            st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_resource
+def get_cold_start_profile():
+    return {}
+
+def mark_stage(profile, stage):
+    profile.append((stage, time.perf_counter()))
+
+def render_startup_profile(profile):
+    stages = [stage for stage, _ in profile[1:]] + ['total']
+    durations = [(end - start) * 1000 for (_, start), (_, end) in zip(profile, profile[1:])]
+    durations.append((profile[-1][1] - profile[0][1]) * 1000)
+
+    # The first run in a server process is the cold start; keep its timings.
+    cold_start = get_cold_start_profile()
+    if not cold_start:
+        cold_start.update(zip(stages, durations))
+
+    report = pd.DataFrame({
+        'Cold start (ms)': pd.Series(cold_start),
+        'This run (ms)': pd.Series(dict(zip(stages, durations))),
+    }).round(1)
+    with st.sidebar.expander("Startup profile"):
+        st.dataframe(report, use_container_width=True)
+
 def main():
+    profile = [('start', SCRIPT_START), ('imports', IMPORTS_DONE)]
     st.sidebar.title("Sidebar Options")
 
     post_data_df_path = 'streamlit/data/post_data_1_df.csv'
     sentiment_df_path = 'streamlit/data/sentiment_2_df.csv'
+    comments_json_path = 'data/instagram_tagged_posts_20241229_195451.json'
+    term_index_path = 'streamlit/data/term_index_3_df.csv'
+    term_index_fingerprint_path = 'streamlit/data/term_index_3_df.json'
 
-    post_data_df = load_data(post_data_df_path)
-    sentiment_df = load_data(sentiment_df_path)
+    post_data_df = load_data(post_data_df_path, data_version=get_data_version(post_data_df_path))
+    comment_store = build_comment_store(
+        sentiment_df_path,
+        get_data_version(sentiment_df_path),
+        comments_json_path,
+        get_data_version(comments_json_path)
+    )
+    mark_stage(profile, 'load data')
 
     filtered_post_data_df = post_data_df[['username', 'post_link', 'likes_count', 'comments_count']]
 
@@ -143,7 +351,7 @@ def main():
         index=0
     )
     
-    sentiment_options = ['positive', 'neutral', 'negative']
+    sentiment_options = SENTIMENT_LABELS
     selected_sentiments = st.sidebar.multiselect(
         "Filter by sentiment:",
         sentiment_options,
@@ -152,16 +360,12 @@ def main():
 
     if selected_username == "All Posts":
         displayed_filtered_post_data_df = post_data_df
-        filtered_sentiment_df = sentiment_df
     else:
         displayed_filtered_post_data_df = post_data_df[post_data_df['username'] == selected_username]
-        filtered_sentiment_df = sentiment_df[sentiment_df['post_username'] == selected_username]
-   
-    if selected_comment_type == 'non-reply':
-        filtered_sentiment_df = filtered_sentiment_df[filtered_sentiment_df['Comment'].str[0] != '@']
 
-    if selected_sentiments:
-        filtered_sentiment_df = filtered_sentiment_df[filtered_sentiment_df['Sentiment'].isin(selected_sentiments)]
+    filter_key = (selected_username, selected_comment_type, tuple(selected_sentiments))
+    filtered_positions = filter_comment_positions(comment_store, comment_store['data_version'], *filter_key)
+    mark_stage(profile, 'filters')
     
     st.title("Sebelas Rasa Sentiment Analysis")
 
@@ -197,9 +401,13 @@ def main():
                 </div>
             </div>
             """.format(total_posts, total_likes, total_comments), unsafe_allow_html=True)
+    mark_stage(profile, 'overview')
     with col2:
+        import plotly.express as px
+
         labels = selected_sentiments
-        values = [filtered_sentiment_df[filtered_sentiment_df['Sentiment'] == label].shape[0] for label in labels]
+        sentiment_counts = np.bincount(comment_store['sentiment_codes'][filtered_positions] + 1, minlength=len(SENTIMENT_LABELS) + 1)
+        values = [int(sentiment_counts[SENTIMENT_LABELS.index(label) + 1]) for label in labels]
         
         fig = px.pie(
             names=labels,
@@ -208,12 +416,72 @@ def main():
             color_discrete_sequence=px.colors.qualitative.Set3
         )
         st.plotly_chart(fig)
+    mark_stage(profile, 'sentiment chart')
+
+    with st.container():
+        term_index = load_term_index(
+            comment_store,
+            comment_store['data_version'],
+            sentiment_df_path,
+            term_index_path,
+            term_index_fingerprint_path,
+            tuple(get_data_version(path) for path in (term_index_path, term_index_fingerprint_path) + TERM_STOPWORD_PATHS)
+        )
+        display_top_words(term_index, selected_username, selected_comment_type, selected_sentiments)
+    mark_stage(profile, 'top words')
 
     with st.container():
         st.title("Comments")
-        columns_to_exclude = ['post_username']
-        display_columns = [col for col in filtered_sentiment_df.columns if col not in columns_to_exclude]
-        st.dataframe(filtered_sentiment_df[display_columns], use_container_width=True)
+        comments = comment_store['comments']
+        columns_to_exclude = ['post_username', 'is_reply']
+        display_columns = [col for col in comments.columns if col not in columns_to_exclude]
+
+        search_query = st.text_input(
+            "Search comments:",
+            placeholder="e.g. mahal, antri (prefixes match too)"
+        ).strip()
+        if search_query and not search_query_terms(search_query):
+            st.caption("Type at least two letters or digits to search.")
+            search_query = ''
+
+        sort_col, order_col, size_col, page_col = st.columns(4)
+        sort_options = [option for option, column in SORT_OPTIONS.items() if column is None or column in comments.columns]
+        selected_sort = sort_col.selectbox("Sort by", sort_options, index=0, key='comment_sort')
+        sort_column = SORT_OPTIONS.get(selected_sort)
+        # File and relevance order have no direction, so Order only applies
+        # to a sort column.
+        selected_order = order_col.selectbox("Order", ['Descending', 'Ascending'], index=0, disabled=sort_column is None)
+        page_size = size_col.selectbox("Rows per page", PAGE_SIZE_OPTIONS, index=1)
+
+        ascending = selected_order == 'Ascending'
+        search_start = time.perf_counter()
+        sorted_positions = sort_comment_positions(
+            comment_store,
+            comment_store['data_version'],
+            *filter_key,
+            sort_column,
+            ascending,
+            search_query
+        )
+        search_ms = (time.perf_counter() - search_start) * 1000
+
+        total_comments = len(sorted_positions)
+        total_pages = max(1, -(-total_comments // page_size))
+        page = page_col.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+
+        page_start = (page - 1) * page_size
+        page_stop = min(page_start + page_size, total_comments)
+        page_df = comments.iloc[sorted_positions[page_start:page_stop]]
+        st.dataframe(page_df[display_columns], use_container_width=True)
+        if search_query:
+            st.caption(f"{total_comments:,} comments match \"{search_query}\" ({search_ms:.1f} ms)")
+        if total_comments:
+            st.caption(f"Showing {page_start + 1:,}–{page_stop:,} of {total_comments:,} comments (page {page} of {total_pages})")
+        else:
+            st.caption("No comments match the current filters.")
+    mark_stage(profile, 'comments table')
+
+    render_startup_profile(profile)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
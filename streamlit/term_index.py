@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from text_processing import TERM_STOPWORD_LISTS, TERM_STOPWORD_PATHS, extract_terms, flag_replies
+
+SENTIMENT_DF_PATH = 'streamlit/data/sentiment_2_df.csv'
+TERM_INDEX_PATH = 'streamlit/data/term_index_3_df.csv'
+TERM_INDEX_FINGERPRINT_PATH = 'streamlit/data/term_index_3_df.json'
+# Bump whenever normalize_text, tokenize or build_term_counts change what
+# ends up in the index.
+TERM_INDEX_VERSION = 1
+TERM_GROUP_COLUMNS = ['post_username', 'Sentiment', 'is_reply']
+
+def build_term_counts(comments_df):
+    comments_df = comments_df.assign(
+        is_reply=flag_replies(comments_df['Comment']),
+        term=comments_df['Comment'].map(extract_terms),
+    )
+    terms = comments_df[TERM_GROUP_COLUMNS + ['term']].explode('term').dropna()
+    counts = terms.groupby(TERM_GROUP_COLUMNS + ['term'], observed=True).size().rename('count').reset_index()
+    return counts.sort_values(TERM_GROUP_COLUMNS + ['count', 'term'], ascending=[True, True, True, False, True])
+
+def file_fingerprint(file_path):
+    # Line endings are normalized so a CRLF checkout still matches the index.
+    digest = hashlib.sha256()
+    size = 0
+    pending = b''
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            chunk = pending + chunk
+            pending = chunk[-1:] if chunk.endswith(b'\r') else b''
+            chunk = chunk[:len(chunk) - len(pending)].replace(b'\r\n', b'\n')
+            digest.update(chunk)
+            size += len(chunk)
+    digest.update(pending)
+    return {'sha256': digest.hexdigest(), 'size': size + len(pending)}
+
+def term_index_fingerprint(sentiment_df_path):
+    return {
+        'term_index_version': TERM_INDEX_VERSION,
+        'sentiment_df': file_fingerprint(sentiment_df_path),
+        'stopwords': {
+            name: file_fingerprint(path)
+            for name, path in zip(TERM_STOPWORD_LISTS, TERM_STOPWORD_PATHS)
+            if os.path.exists(path)
+        },
+    }
+
+def is_term_index_current(index_path, fingerprint_path, sentiment_df_path):
+    try:
+        with open(fingerprint_path, 'r', encoding='utf-8') as file:
+            stored_fingerprint = json.load(file)
+        return os.path.exists(index_path) and stored_fingerprint == term_index_fingerprint(sentiment_df_path)
+    except (OSError, ValueError):
+        return False
+
+def build_term_index(term_counts):
+    term_counts = term_counts.astype({'post_username': str, 'Sentiment': str, 'is_reply': bool})
+    term_counts = term_counts.sort_values(TERM_GROUP_COLUMNS, kind='stable').reset_index(drop=True)
+    term_ids, vocabulary = pd.factorize(term_counts['term'])
+    counts = term_counts['count'].to_numpy(dtype=np.int64)
+
+    # Every (post, sentiment, reply) group is a contiguous run of term ids and
+    # counts, listed under its post so one post is a single dict lookup.
+    offsets = {}
+    for (post_username, sentiment, is_reply), positions in term_counts.groupby(TERM_GROUP_COLUMNS, sort=False).indices.items():
+        offsets.setdefault(post_username, []).append((sentiment, is_reply, int(positions[0]), int(positions[-1]) + 1))
+
+    # "All Posts" would merge every group, so keep those pre-summed per
+    # (sentiment, reply) pair.
+    totals = {
+        key: np.bincount(term_ids[positions], weights=counts[positions], minlength=len(vocabulary)).astype(np.int64)
+        for key, positions in term_counts.groupby(['Sentiment', 'is_reply']).indices.items()
+    }
+
+    return {
+        'vocabulary': np.asarray(vocabulary, dtype=object),
+        'term_ids': term_ids,
+        'counts': counts,
+        'offsets': offsets,
+        'totals': totals,
+    }
+
+def rank_terms(vocabulary, term_ids, counts, k):
+    k = min(k, len(term_ids))
+    if not k:
+        return pd.DataFrame({'term': pd.Series(dtype=object), 'count': pd.Series(dtype=np.int64)})
+
+    # Keep every term tied with the k-th count so ties break alphabetically.
+    threshold = np.partition(counts, len(counts) - k)[len(counts) - k]
+    top = np.flatnonzero(counts >= threshold)
+    top = top[np.lexsort((vocabulary[term_ids[top]], -counts[top]))][:k]
+    return pd.DataFrame({'term': vocabulary[term_ids[top]], 'count': counts[top]})
+
+def top_terms(term_index, username=None, sentiments=None, include_replies=True, k=10):
+    vocabulary = term_index['vocabulary']
+
+    def wanted(sentiment, is_reply):
+        return (not sentiments or sentiment in sentiments) and (include_replies or not is_reply)
+
+    if username is None:
+        vectors = [vector for (sentiment, is_reply), vector in term_index['totals'].items() if wanted(sentiment, is_reply)]
+        totals = np.sum(vectors, axis=0) if vectors else np.zeros(len(vocabulary), dtype=np.int64)
+        term_ids = np.flatnonzero(totals)
+        return rank_terms(vocabulary, term_ids, totals[term_ids], k)
+
+    slices = [
+        slice(start, stop)
+        for sentiment, is_reply, start, stop in term_index['offsets'].get(username, [])
+        if wanted(sentiment, is_reply)
+    ]
+    if not slices:
+        return rank_terms(vocabulary, np.array([], dtype=np.int64), np.array([], dtype=np.int64), k)
+
+    # Only the terms this post uses are merged, not the whole vocabulary.
+    term_ids, inverse = np.unique(np.concatenate([term_index['term_ids'][s] for s in slices]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([term_index['counts'][s] for s in slices])).astype(np.int64)
+    return rank_terms(vocabulary, term_ids, counts, k)
+
+def main():
+    comments_df = pd.read_csv(SENTIMENT_DF_PATH)
+    term_counts = build_term_counts(comments_df)
+    term_counts.to_csv(TERM_INDEX_PATH, index=False)
+    with open(TERM_INDEX_FINGERPRINT_PATH, 'w', encoding='utf-8') as file:
+        json.dump(term_index_fingerprint(SENTIMENT_DF_PATH), file, indent=4)
+        file.write('\n')
+    print(f"Wrote {len(term_counts):,} term counts to {TERM_INDEX_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import re
+from functools import lru_cache
+
+STOPWORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'stopwords')
+TERM_STOPWORD_LISTS = ('indonesian', 'slang')
+TERM_STOPWORD_PATHS = tuple(os.path.join(STOPWORDS_DIR, f'{name}.txt') for name in TERM_STOPWORD_LISTS)
+
+MENTION_PATTERN = re.compile(r'@[\w.]+')
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+LAUGH_PATTERN = re.compile(r'\b(?:(?:wk)+w?|(?:ha)+h?|(?:he)+h?|(?:hi)+h?)\b')
+REPEATED_CHAR_PATTERN = re.compile(r'(\w)\1{2,}')
+TOKEN_PATTERN = re.compile(r'[a-z]{2,}')
+# Search keeps digits and every token length so handles ("@nila_riska" ->
+# "nila", "riska") and names like "7eleven" stay findable.
+SEARCH_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+REPEATED_LETTER_PATTERN = re.compile(r'([a-z])\1{2,}')
+MIN_SEARCH_QUERY_LENGTH = 2
+
+@lru_cache(maxsize=None)
+def load_stopwords(language='indonesian'):
+    # Stopwords ship with the app so startup never touches the network. An
+    # NLTK corpus that is already on disk is only used as a fallback.
+    path = os.path.join(STOPWORDS_DIR, f'{language}.txt')
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return frozenset(line.strip() for line in file if line.strip())
+    except FileNotFoundError:
+        pass
+
+    try:
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words(language))
+    except (ImportError, LookupError, OSError):
+        return frozenset()
+
+@lru_cache(maxsize=None)
+def load_term_stopwords():
+    return frozenset().union(*(load_stopwords(name) for name in TERM_STOPWORD_LISTS))
+
+def flag_replies(comments):
+    # A comment that opens with a mention is a reply to that user.
+    return comments.astype('string').str.startswith('@').fillna(False).astype(bool)
+
+def normalize_text(text):
+    if not isinstance(text, str):
+        return ''
+    text = text.lower()
+    text = URL_PATTERN.sub(' ', text)
+    text = MENTION_PATTERN.sub(' ', text)
+    # "enakkk" and "bangettt" count as "enak" and "banget".
+    text = REPEATED_CHAR_PATTERN.sub(r'\1', text)
+    return LAUGH_PATTERN.sub(' ', text)
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+def extract_terms(text):
+    stopwords = load_term_stopwords()
+    return [token for token in tokenize(text) if token not in stopwords]
+
+def normalize_search_text(text):
+    if not isinstance(text, str):
+        return ''
+    text = URL_PATTERN.sub(' ', text.lower())
+    return REPEATED_LETTER_PATTERN.sub(r'\1', text)
+
+def search_tokenize(text):
+    return SEARCH_TOKEN_PATTERN.findall(normalize_search_text(text))
+
+def search_query_terms(query):
+    terms = list(dict.fromkeys(search_tokenize(query)))
+    # A lone letter would match most of the index, so it is not a query.
+    if sum(len(term) for term in terms) < MIN_SEARCH_QUERY_LENGTH:
+        return []
+    return terms